@@ -0,0 +1,485 @@
+"""
+Snapshot archive for CPME Monitor.
+
+Keeps the raw HTML of every scraped page for auditing and for re-running
+extraction when the CPME markup changes. Snapshots are deduplicated by
+content hash, zlib-compressed and appended to segment files; a fixed-size
+binary index maps each snapshot to its segment offset. Segments are read
+back through mmap, and sealed segments are periodically compacted
+(recompressed, merged and pruned of expired snapshots).
+
+Usage:
+    python -m src.archive extract --since 2025-01-01 --until 2025-02-01
+    python -m src.archive compact
+    python -m src.archive stats
+"""
+
+import argparse
+import bisect
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+from datetime import datetime
+from html.parser import HTMLParser
+from itertools import groupby
+from operator import attrgetter
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .config import ARCHIVE_DIR, ARCHIVE_SEGMENT_SIZE, ARCHIVE_RETENTION_DAYS, ARCHIVE_COMPACT_INTERVAL, CRAWL_MAX_PAGES
+
+# timestamp, page number, sha256 digest, segment id, offset, compressed length
+INDEX_RECORD = struct.Struct("<dI32sIQI")
+INDEX_FILE = "index.bin"
+LOCK_FILE = "archive.lock"
+# Compacted segments carry a ".compact" marker so they are not recompressed again
+SEGMENT_PATTERN = re.compile(r"^segment-(\d{6})(\.compact)?\.seg$")
+
+# Fast compression on the hot path, best compression when compacting
+APPEND_LEVEL = 1
+COMPACT_LEVEL = 9
+
+DEFAULT_PATTERN = r"Andares disponíveis\D*?(\d+)"
+
+IndexEntry = namedtuple("IndexEntry", "timestamp page digest segment offset length")
+
+
+def _segment_name(segment: int, compacted: bool) -> str:
+    return f"segment-{segment:06d}{'.compact' if compacted else ''}.seg"
+
+
+def _open_map(path: Path) -> mmap.mmap:
+    with path.open("rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ArchiveLockedError(Exception):
+    """Another process is already writing to the archive."""
+
+
+class SnapshotArchive:
+    """
+    Append-only, deduplicated, compressed store of page snapshots.
+
+    A writable archive holds an exclusive lock on the directory for as long as
+    it is open, so only one process (normally the monitor) appends and
+    compacts. Read-only archives take no lock.
+    """
+
+    def __init__(self, directory: Path, segment_size: int = ARCHIVE_SEGMENT_SIZE, writable: bool = True) -> None:
+        self.directory = directory
+        self.segment_size = segment_size
+        self._lock_file = None
+        if writable:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._acquire_writer_lock()
+        self._lock = threading.Lock()
+        # Only one compaction at a time; appends and reads only need _lock
+        self._compact_lock = threading.Lock()
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._load()
+
+    def _acquire_writer_lock(self) -> None:
+        lock_file = (self.directory / LOCK_FILE).open("a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise ArchiveLockedError(f"{self.directory} is in use by another process (is the monitor running?)") from None
+        self._lock_file = lock_file
+
+    def _check_writable(self) -> None:
+        if self._lock_file is None:
+            raise ArchiveLockedError(f"{self.directory} was opened read-only")
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / _segment_name(segment, segment in self._compacted)
+
+    def _segments(self) -> Dict[int, bool]:
+        """Segment ids on disk, mapped to whether they are compacted."""
+        segments = {}
+        for path in self.directory.iterdir():
+            match = SEGMENT_PATTERN.match(path.name)
+            if match:
+                segments[int(match.group(1))] = bool(match.group(2))
+        return segments
+
+    def _segment_ids(self) -> List[int]:
+        return sorted(self._segments())
+
+    def _load(self) -> None:
+        self.entries: List[IndexEntry] = []
+        index_path = self.directory / INDEX_FILE
+        if index_path.exists():
+            data = index_path.read_bytes()
+            # Ignore a trailing partial record left by an interrupted write
+            usable = len(data) - len(data) % INDEX_RECORD.size
+            self.entries = [IndexEntry(*fields) for fields in INDEX_RECORD.iter_unpack(data[:usable])]
+        self.entries.sort(key=lambda entry: entry.timestamp)
+        self._timestamps = [entry.timestamp for entry in self.entries]
+        self._blobs = {entry.digest: (entry.segment, entry.offset, entry.length) for entry in self.entries}
+
+        segments = self._segments()
+        self._compacted = {segment for segment, compacted in segments.items() if compacted}
+        raw = sorted(segment for segment, compacted in segments.items() if not compacted)
+        self._next_id = max(segments) + 1 if segments else 1
+        self._active = raw[-1] if raw else self._allocate()
+
+    def _allocate(self) -> int:
+        segment = self._next_id
+        self._next_id += 1
+        return segment
+
+    def append(self, timestamp: float, pages: List[str]) -> None:
+        """Archive the pages scraped in one check."""
+        self._check_writable()
+        with self._lock:
+            records = []
+            for page, html in enumerate(pages):
+                raw = html.encode()
+                digest = hashlib.sha256(raw).digest()
+                if digest not in self._blobs:
+                    self._blobs[digest] = self._write_blob(zlib.compress(raw, APPEND_LEVEL))
+                entry = IndexEntry(timestamp, page, digest, *self._blobs[digest])
+                records.append(INDEX_RECORD.pack(*entry))
+                self._add_entry(entry)
+
+            with (self.directory / INDEX_FILE).open("ab") as f:
+                f.write(b"".join(records))
+
+    def _add_entry(self, entry: IndexEntry) -> None:
+        if self._timestamps and entry.timestamp < self._timestamps[-1]:
+            index = bisect.bisect_right(self._timestamps, entry.timestamp)
+            self.entries.insert(index, entry)
+            self._timestamps.insert(index, entry.timestamp)
+        else:
+            self.entries.append(entry)
+            self._timestamps.append(entry.timestamp)
+
+    def _write_blob(self, blob: bytes) -> Tuple[int, int, int]:
+        path = self._segment_path(self._active)
+        if path.exists() and path.stat().st_size >= self.segment_size:
+            self._active = self._allocate()
+            path = self._segment_path(self._active)
+        with path.open("ab") as f:
+            offset = f.tell()
+            f.write(blob)
+        return self._active, offset, len(blob)
+
+    def _map(self, segment: int, end: int) -> mmap.mmap:
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < end:
+            # The active segment grows, so remap when reading past the old end
+            if mapped is not None:
+                mapped.close()
+            mapped = _open_map(self._segment_path(segment))
+            self._maps[segment] = mapped
+        return mapped
+
+    def _read_blob(self, segment: int, offset: int, length: int) -> bytes:
+        return self._map(segment, offset + length)[offset:offset + length]
+
+    def read(self, entry: IndexEntry) -> str:
+        """
+        Return the HTML of an archived snapshot.
+
+        A compaction in the writer process may have moved the snapshot since
+        this archive loaded its index; the index is then reloaded to find it.
+        """
+        with self._lock:
+            try:
+                blob = self._read_blob(entry.segment, entry.offset, entry.length)
+            except FileNotFoundError:
+                self._reload()
+                location = self._blobs.get(entry.digest)
+                if location is None:
+                    # Expired and dropped by the compaction
+                    raise
+                blob = self._read_blob(*location)
+        return zlib.decompress(blob).decode()
+
+    def _reload(self) -> None:
+        for mapped in self._maps.values():
+            mapped.close()
+        self._maps.clear()
+        self._load()
+
+    def range(self, start: Optional[float] = None, end: Optional[float] = None) -> List[IndexEntry]:
+        """Index entries with start <= timestamp < end, oldest first."""
+        with self._lock:
+            lo = bisect.bisect_left(self._timestamps, start) if start is not None else 0
+            hi = bisect.bisect_left(self._timestamps, end) if end is not None else len(self.entries)
+            return self.entries[lo:hi]
+
+    def compact(self, retention_days: int = ARCHIVE_RETENTION_DAYS) -> None:
+        """
+        Recompress sealed segments that haven't been compacted yet into one
+        compacted segment, dropping snapshots older than retention_days (0 keeps
+        all). Already-compacted segments are only rewritten, byte for byte,
+        when expired snapshots freed some of their blobs.
+
+        The heavy work runs without holding the archive lock, so appends carry
+        on meanwhile; the lock is only taken to plan and to swap the index.
+        """
+        self._check_writable()
+        with self._compact_lock:
+            with self._lock:
+                cutoff = time.time() - retention_days * 86400 if retention_days > 0 else None
+                live = {entry.digest for entry in self.entries if cutoff is None or entry.timestamp >= cutoff}
+                raw_sealed = {segment for segment in self._segment_ids()
+                              if segment not in self._compacted and segment != self._active}
+                stale = {segment for digest, (segment, _, _) in self._blobs.items()
+                         if segment in self._compacted and digest not in live}
+                sources = raw_sealed | stale
+                if not sources:
+                    return
+                blobs = sorted((location, digest) for digest, location in self._blobs.items()
+                               if location[0] in sources and digest in live)
+                sources_compacted = {segment: segment in self._compacted for segment in sources}
+                new_segment = self._allocate()
+
+            # Sealed segments never change, so they can be read without the lock
+            new_path = self.directory / _segment_name(new_segment, True)
+            tmp_path = new_path.with_suffix(".tmp")
+            moved: Dict[bytes, Tuple[int, int, int]] = {}
+            maps: Dict[int, mmap.mmap] = {}
+            try:
+                with tmp_path.open("wb") as f:
+                    for (segment, offset, length), digest in blobs:
+                        if segment not in maps:
+                            maps[segment] = _open_map(self.directory / _segment_name(segment, sources_compacted[segment]))
+                        blob = maps[segment][offset:offset + length]
+                        if not sources_compacted[segment]:
+                            blob = zlib.compress(zlib.decompress(blob), COMPACT_LEVEL)
+                        moved[digest] = (new_segment, f.tell(), len(blob))
+                        f.write(blob)
+                    f.flush()
+                    os.fsync(f.fileno())
+            finally:
+                for mapped in maps.values():
+                    mapped.close()
+            size = tmp_path.stat().st_size
+
+            with self._lock:
+                if moved:
+                    self._compacted.add(new_segment)
+                    os.replace(tmp_path, new_path)
+                else:
+                    tmp_path.unlink()
+
+                entries = []
+                for entry in self.entries:
+                    if cutoff is not None and entry.timestamp < cutoff:
+                        continue
+                    if entry.digest in moved:
+                        segment, offset, length = moved[entry.digest]
+                        entry = entry._replace(segment=segment, offset=offset, length=length)
+                    elif entry.segment in sources:
+                        # Appended during compaction, deduplicated against a blob that
+                        # was expired and not carried over: copy it to the active segment
+                        mapped = self._map(entry.segment, entry.offset + entry.length)
+                        moved[entry.digest] = self._write_blob(mapped[entry.offset:entry.offset + entry.length])
+                        segment, offset, length = moved[entry.digest]
+                        entry = entry._replace(segment=segment, offset=offset, length=length)
+                    entries.append(entry)
+
+                index_path = self.directory / INDEX_FILE
+                tmp_index = index_path.with_suffix(".tmp")
+                tmp_index.write_bytes(b"".join(INDEX_RECORD.pack(*entry) for entry in entries))
+                os.replace(tmp_index, index_path)
+
+                # The index no longer references the old segments, so they can go
+                for segment in sources:
+                    mapped = self._maps.pop(segment, None)
+                    if mapped is not None:
+                        mapped.close()
+                    self._segment_path(segment).unlink()
+                    self._compacted.discard(segment)
+
+                logging.info(f"Compacted {len(sources)} segment(s) into {size} bytes, "
+                             f"dropped {len(self.entries) - len(entries)} expired snapshot(s)")
+
+                self.entries = entries
+                self._timestamps = [entry.timestamp for entry in entries]
+                self._blobs = {entry.digest: (entry.segment, entry.offset, entry.length) for entry in entries}
+
+    def close(self) -> None:
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+
+class _TextExtractor(HTMLParser):
+    """Collect the visible text of an HTML document."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def extract_count(html: str, pattern: str = DEFAULT_PATTERN, total: bool = False) -> int:
+    """
+    Extract the listing count from archived HTML, like the scraper does:
+    the first number following "Andares disponíveis", or 0 if none. With
+    total, the sum of every such number on the page.
+    """
+    parser = _TextExtractor()
+    parser.feed(html)
+    text = " ".join(" ".join(parser.parts).split())
+    if total:
+        return sum(int(match.group(1)) for match in re.finditer(pattern, text))
+    match = re.search(pattern, text)
+    return int(match.group(1)) if match else 0
+
+
+def reextract(archive: SnapshotArchive, start: Optional[float] = None, end: Optional[float] = None,
+              pattern: str = DEFAULT_PATTERN, total: bool = CRAWL_MAX_PAGES > 1) -> Iterator[Tuple[float, int]]:
+    """
+    Yield (timestamp, count) for every archived check in a time range.
+
+    Like the scraper, the count is the first listing on the first page, or
+    with total (the scraper's mode when CRAWL_MAX_PAGES > 1) the sum over
+    every page of the check. Unlike the scraper, a listing repeated on
+    several pages is counted on each of them.
+    """
+    counts: Dict[bytes, int] = {}
+    # All pages of a check are archived with the same timestamp
+    for timestamp, entries in groupby(archive.range(start, end), key=attrgetter("timestamp")):
+        if not total:
+            entries = [entry for entry in entries if entry.page == 0]
+            if not entries:
+                continue
+        count = 0
+        for entry in entries:
+            # Identical snapshots are stored once, so extract each only once
+            if entry.digest not in counts:
+                counts[entry.digest] = extract_count(archive.read(entry), pattern, total)
+            count += counts[entry.digest]
+        yield timestamp, count
+
+
+_archive: Optional[SnapshotArchive] = None
+_archive_unavailable = False
+_archive_lock = threading.Lock()
+
+
+def get_archive() -> Optional[SnapshotArchive]:
+    """
+    Return the shared archive, or None when ARCHIVE_DIR is not configured or
+    the archive can't be opened (e.g. another process holds it, or the
+    directory isn't writable). Archiving is best-effort and never stops a scrape.
+    """
+    global _archive, _archive_unavailable
+    if ARCHIVE_DIR is None or _archive_unavailable:
+        return None
+    with _archive_lock:
+        if _archive is None and not _archive_unavailable:
+            try:
+                _archive = SnapshotArchive(ARCHIVE_DIR)
+            except Exception as e:
+                logging.error(f"Archiving disabled: {e}")
+                _archive_unavailable = True
+        return _archive
+
+
+def run_compaction_loop() -> None:
+    """Compact the archive every ARCHIVE_COMPACT_INTERVAL seconds (for a background thread)."""
+    while True:
+        time.sleep(ARCHIVE_COMPACT_INTERVAL)
+        try:
+            archive = get_archive()
+            if archive is not None:
+                archive.compact()
+        except Exception as e:
+            logging.error(f"Archive compaction failed: {e}")
+
+
+def _parse_time(value: str) -> float:
+    return datetime.fromisoformat(value).timestamp()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect and maintain the snapshot archive")
+    parser.add_argument("--dir", type=Path, default=ARCHIVE_DIR, help="Archive directory (default: ARCHIVE_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser("extract", help="Re-extract counts over a time range as CSV")
+    extract.add_argument("--since", type=_parse_time, help="ISO start time (inclusive)")
+    extract.add_argument("--until", type=_parse_time, help="ISO end time (exclusive)")
+    extract.add_argument("--pattern", default=DEFAULT_PATTERN, help="Regex whose first group is the count")
+    extract.add_argument("--changes-only", action="store_true", help="Only print rows where the count changed")
+    extract.add_argument("--total", action=argparse.BooleanOptionalAction, default=CRAWL_MAX_PAGES > 1,
+                         help="Sum every listing on every page of a check, as the scraper does when "
+                              "CRAWL_MAX_PAGES > 1 (default: follow CRAWL_MAX_PAGES). Listings repeated "
+                              "across pages are counted once per page")
+
+    compact = commands.add_parser("compact", help="Compact sealed segments now")
+    compact.add_argument("--retention-days", type=int, default=ARCHIVE_RETENTION_DAYS)
+
+    commands.add_parser("stats", help="Show archive size and contents")
+    args = parser.parse_args()
+
+    if args.dir is None:
+        parser.error("No archive directory: pass --dir or set ARCHIVE_DIR")
+    if not args.dir.is_dir():
+        parser.error(f"No archive at {args.dir}")
+    if args.command == "compact":
+        # Compacting needs the writer lock; a running monitor compacts in its own background thread
+        try:
+            archive = SnapshotArchive(args.dir)
+        except ArchiveLockedError as e:
+            parser.exit(1, f"Cannot compact: {e}\n")
+    else:
+        archive = SnapshotArchive(args.dir, writable=False)
+
+    if args.command == "extract":
+        print("timestamp,count")
+        previous = None
+        for timestamp, count in reextract(archive, args.since, args.until, args.pattern, args.total):
+            if args.changes_only and count == previous:
+                continue
+            previous = count
+            print(f"{datetime.fromtimestamp(timestamp).isoformat()},{count}")
+    elif args.command == "compact":
+        archive.compact(args.retention_days)
+    else:
+        entries = archive.range()
+        size = sum(path.stat().st_size for path in args.dir.iterdir() if path.is_file())
+        print(f"Snapshots: {len(entries)}")
+        print(f"Unique pages: {len({entry.digest for entry in entries})}")
+        print(f"Segments: {len(archive._segment_ids())}")
+        print(f"Size on disk: {size} bytes")
+        if entries:
+            print(f"From {datetime.fromtimestamp(entries[0].timestamp).isoformat()} "
+                  f"to {datetime.fromtimestamp(entries[-1].timestamp).isoformat()}")
+
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,29 @@ ENABLE_HEALTH_SERVER = os.getenv("ENABLE_HEALTH_SERVER", "true").lower() == "tru
 HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8080"))
 CPME_URL = os.getenv("CPME_URL", "https://cpme.fyidigital.pt/arrendamento")
 
+# Watchdog settings (seconds)
+SCRAPE_TIMEOUT = int(os.getenv("SCRAPE_TIMEOUT", "90"))
+NOTIFY_TIMEOUT = int(os.getenv("NOTIFY_TIMEOUT", "60"))
+PAGE_TIMEOUT = int(os.getenv("PAGE_TIMEOUT", "30"))
+WATCHDOG_MAX_STUCK = int(os.getenv("WATCHDOG_MAX_STUCK", "3"))
+
+# Crawl settings (pagination / infinite scroll)
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "1"))
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))
+CRAWL_MAX_SCROLLS = int(os.getenv("CRAWL_MAX_SCROLLS", "0"))
+
+# Tracing and profiling settings
+TRACE_CHECKS = os.getenv("TRACE_CHECKS", "true").lower() == "true"
+TRACE_FILE = Path(os.getenv("TRACE_FILE")) if os.getenv("TRACE_FILE") else None
+PROFILE_CHECK = int(os.getenv("PROFILE_CHECK", "0"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+
+# Snapshot archive settings (disabled unless ARCHIVE_DIR is set)
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR")) if os.getenv("ARCHIVE_DIR") else None
+ARCHIVE_SEGMENT_SIZE = int(os.getenv("ARCHIVE_SEGMENT_SIZE", str(16 * 1024 * 1024)))
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "0"))
+ARCHIVE_COMPACT_INTERVAL = int(os.getenv("ARCHIVE_COMPACT_INTERVAL", "86400"))
+
 # Pushover settings
 PUSHOVER_USER_KEY = os.getenv("PUSHOVER_USER_KEY")
 PUSHOVER_API_TOKEN = os.getenv("PUSHOVER_API_TOKEN")
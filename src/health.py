@@ -12,6 +12,7 @@ from datetime import datetime, timedelta
 from http.server import HTTPServer, BaseHTTPRequestHandler
 
 from .config import HEALTH_PORT, LAST_COUNT_FILE, HEARTBEAT_FILE
+from .watchdog import watchdog
 
 class HealthHandler(BaseHTTPRequestHandler):
     def do_GET(self):
@@ -42,11 +43,25 @@ class HealthHandler(BaseHTTPRequestHandler):
                 code = 200
                 message = "Monitor starting up"
             
+            # Explain any stalls the watchdog caught and recovered from
+            components = watchdog.status()
+            for name, state in components.items():
+                if state["status"] == "stalled":
+                    message += f". {name} stalled ({state['last_stall_reason']}), retrying"
+                elif state["status"] == "recovered":
+                    message += f". {name} recovered in {state['recovery_seconds']}s after stall ({state['last_stall_reason']})"
+                if state["restarts"]:
+                    message += f". {name} restarted {state['restarts']} time(s)"
+                    if state["failed_restarts"]:
+                        message += f", {state['failed_restarts']} failed (last at {state['last_failed_restart']})"
+            
             response = {
                 "status": status,
                 "message": message,
                 "timestamp": datetime.now().isoformat()
             }
+            if components:
+                response["components"] = components
             
             self.send_response(code)
             self.send_header("Content-Type", "application/json")
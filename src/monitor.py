@@ -10,11 +10,17 @@ import signal
 import sys
 import threading
 import time
-from typing import Any, NoReturn
+from typing import Any, Callable, NoReturn, Optional
 
-from .config import LAST_COUNT_FILE, HEARTBEAT_FILE, POLL_INTERVAL, ENABLE_HEALTH_SERVER, CPME_URL
+from .config import (
+    LAST_COUNT_FILE, HEARTBEAT_FILE, POLL_INTERVAL, ENABLE_HEALTH_SERVER, CPME_URL, ARCHIVE_DIR,
+    SCRAPE_TIMEOUT, NOTIFY_TIMEOUT
+)
 from .scraper import fetch_habitacional_count
 from .notifications import send_all_notifications
+from .archive import run_compaction_loop
+from .tracing import start_check, end_check, span, annotate, profile_check
+from .watchdog import watchdog, StallError
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
@@ -22,31 +28,81 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(mess
 # Global flag for graceful shutdown
 shutdown_requested = False
 
+# Extra time for a timed-out scrape to close its browser before the watchdog gives up on it
+CANCEL_GRACE = 15
+# Delay before retrying after a stall, doubled on each consecutive stall up to POLL_INTERVAL
+STALL_RETRY_DELAY = 5
+
 def signal_handler(signum: int, frame: Any) -> None:
     """Handle shutdown signals gracefully."""
     global shutdown_requested
     logging.info("Shutdown signal received. Finishing current check...")
     shutdown_requested = True
 
+def build_message(current: int, last: int) -> str:
+    """Build the notification message for a change in listing count."""
+    if current > last:
+        diff = current - last
+        return f"Listings updated! Count: {current} (+{diff}). New opportunities may be available. Check {CPME_URL}"
+    diff = last - current
+    return f"Listings updated! Count: {current} (-{diff}). New opportunities may be available (listings can be edited/replaced). Check {CPME_URL}"
+
+def process_count(current: int, last: int, notify: Callable[[str], None] = send_all_notifications) -> int:
+    """
+    Compare a freshly fetched count with the last known one and notify on any change.
+    
+    Returns:
+        int: The new last count.
+    """
+    if current == last:
+        return last
+    
+    # Send all notifications for any change
+    with span("notify"):
+        notify(build_message(current, last))
+    return current
+
+def notify_with_deadline(message: str, send: Callable[[str], None] = send_all_notifications) -> None:
+    """
+    Send notifications, giving up waiting on them after NOTIFY_TIMEOUT.
+
+    Raises:
+        StallError: If they didn't finish in time. The change then isn't saved
+            as notified, so the next check alerts again.
+    """
+    watchdog.run("notifier", lambda: send(message), NOTIFY_TIMEOUT)
+
+def start_health_thread() -> Optional[threading.Thread]:
+    """Start health check server in background (for fly.io). Returns None if it failed to start."""
+    try:
+        from .health import start_health_server
+        health_thread = threading.Thread(target=start_health_server, daemon=True)
+        health_thread.start()
+        # Give it a moment to start and log any immediate errors
+        time.sleep(1)
+        if not health_thread.is_alive():
+            # start_health_server has already logged why
+            return None
+        logging.info("Health check server thread started")
+        return health_thread
+    except ImportError:
+        logging.warning("Health server not available")
+    except Exception as e:
+        logging.error(f"Failed to start health server: {e}")
+    return None
+
 def main() -> NoReturn:
     """Main monitoring loop."""
     # Set up signal handlers for graceful shutdown
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
-    # Start health check server in background (for fly.io)
-    if ENABLE_HEALTH_SERVER:
-        try:
-            from .health import start_health_server
-            health_thread = threading.Thread(target=start_health_server, daemon=True)
-            health_thread.start()
-            logging.info("Health check server thread started")
-            # Give it a moment to start and log any immediate errors
-            time.sleep(1)
-        except ImportError:
-            logging.warning("Health server not available")
-        except Exception as e:
-            logging.error(f"Failed to start health server: {e}")
+    health_thread = start_health_thread() if ENABLE_HEALTH_SERVER else None
+    
+    # Compact the snapshot archive in background
+    if ARCHIVE_DIR is not None:
+        threading.Thread(target=run_compaction_loop, daemon=True).start()
+        logging.info(f"Archiving snapshots to {ARCHIVE_DIR}")
     
     # Load or initialize last count  
     if LAST_COUNT_FILE.exists():
@@ -61,37 +117,56 @@ def main() -> NoReturn:
 
     logging.info(f"Starting monitor loop (checking every {POLL_INTERVAL}s)...")
     
+    check_number = 0
+    consecutive_stalls = 0
     while not shutdown_requested:
+        # Restart just the health server if it died or failed to (re)start; retried every check
+        if ENABLE_HEALTH_SERVER and (health_thread is None or not health_thread.is_alive()):
+            health_thread = start_health_thread()
+            watchdog.record_restart("health_server", succeeded=health_thread is not None)
+        
+        # Heartbeat at the start too, so a long but bounded check doesn't look like a hang
+        HEARTBEAT_FILE.write_text(str(int(time.time())))
+        
+        check_number += 1
+        start_check(check_number)
+        delay = POLL_INTERVAL
         try:
-            current = fetch_habitacional_count()
-            logging.info(f"Fetched count={current} (last={last})")
-            
-            # Update heartbeat for health checks
-            HEARTBEAT_FILE.write_text(str(int(time.time())))
-            
-            if current != last:
-                if current > last:
-                    diff = current - last
-                    message = f"Listings updated! Count: {current} (+{diff}). New opportunities may be available. Check {CPME_URL}"
-                else:
-                    diff = last - current
-                    message = f"Listings updated! Count: {current} (-{diff}). New opportunities may be available (listings can be edited/replaced). Check {CPME_URL}"
+            with profile_check(check_number) as profiler:
+                # Watchdog workers run in their own threads, so they are profiled separately
+                with span("scrape"):
+                    current = watchdog.run("scraper", profiler.wrap(fetch_habitacional_count), SCRAPE_TIMEOUT + CANCEL_GRACE)
+                logging.info(f"Fetched count={current} (last={last})")
+                annotate(count=current, last=last, changed=current != last)
                 
-                # Send all notifications for any change
-                send_all_notifications(message)
+                # Update heartbeat for health checks
+                HEARTBEAT_FILE.write_text(str(int(time.time())))
                 
-                # Update last count
-                last = current
-                LAST_COUNT_FILE.write_text(str(last))
-                logging.info(f"Updated last count to {last}")
-            
-            if not shutdown_requested:
-                time.sleep(POLL_INTERVAL)
+                send = profiler.wrap(send_all_notifications)
+                new_last = process_count(current, last, lambda message: notify_with_deadline(message, send))
+                if new_last != last:
+                    # Update last count
+                    last = new_last
+                    LAST_COUNT_FILE.write_text(str(last))
+                    logging.info(f"Updated last count to {last}")
+            consecutive_stalls = 0
                 
+        except StallError as e:
+            # A stuck scrape or notification has been abandoned; retry soon with a fresh one.
+            # `last` is left as it was, so an alert that didn't go out is sent again.
+            delay = min(STALL_RETRY_DELAY * 2 ** consecutive_stalls, POLL_INTERVAL)
+            consecutive_stalls += 1
+            logging.warning(f"Check {check_number} stalled, retrying in {delay}s")
+            annotate(stall=e.component, stall_reason=e.reason)
+            HEARTBEAT_FILE.write_text(str(int(time.time())))
         except Exception as e:
             logging.error(f"Error in main loop: {e}")
-            if not shutdown_requested:
-                time.sleep(POLL_INTERVAL)
+            annotate(error=str(e))
+        finally:
+            end_check()
+        
+        if not shutdown_requested:
+            time.sleep(delay)
     
     logging.info("Monitor stopped gracefully.")
     sys.exit(0)
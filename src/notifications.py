@@ -10,6 +10,7 @@ from email.message import EmailMessage
 from typing import NoReturn
 
 import requests
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client as TwilioClient
 
 from .config import (
@@ -18,6 +19,10 @@ from .config import (
     TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_FROM_SMS, SMS_RECIPIENTS,
     TWILIO_FROM_WHATSAPP, WHATSAPP_RECIPIENTS
 )
+from .tracing import span
+
+# Per-request timeout (seconds) so one slow provider can't hang the monitor
+REQUEST_TIMEOUT = 15
 
 def send_push(message: str) -> None:
     """Send Pushover notification to iPhone."""
@@ -33,6 +38,7 @@ def send_push(message: str) -> None:
             "message": message,
             "title": "🆕 New CPME Listing"
         },
+        timeout=REQUEST_TIMEOUT,
     )
     resp.raise_for_status()
 
@@ -54,7 +60,7 @@ def send_email(subject: str, body: str) -> None:
             msg["Subject"] = subject
             msg.set_content(body)
             
-            with smtplib.SMTP("smtp.gmail.com", 587) as smtp:
+            with smtplib.SMTP("smtp.gmail.com", 587, timeout=REQUEST_TIMEOUT) as smtp:
                 smtp.starttls()
                 smtp.login(GMAIL_EMAIL, GMAIL_PASSWORD)
                 smtp.send_message(msg)
@@ -73,7 +79,7 @@ def send_sms(body: str) -> None:
         logging.warning("No SMS recipients configured, skipping SMS notification")
         return
     
-    client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=TwilioHttpClient(timeout=REQUEST_TIMEOUT))
     
     for recipient in SMS_RECIPIENTS:
         try:
@@ -92,7 +98,7 @@ def send_whatsapp(body: str) -> None:
         logging.warning("No WhatsApp recipients configured, skipping WhatsApp notification")
         return
     
-    client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=TwilioHttpClient(timeout=REQUEST_TIMEOUT))
     
     for recipient in WHATSAPP_RECIPIENTS:
         try:
@@ -107,21 +113,25 @@ def send_all_notifications(message: str) -> None:
     
     # Send notifications (each function handles its own error checking)
     try:
-        send_push(message)
+        with span("notify_push"):
+            send_push(message)
     except Exception as e:
         logging.error(f"Pushover notification failed: {e}")
     
     try:
-        send_email("🆕 New CPME Listing", message)
+        with span("notify_email"):
+            send_email("🆕 New CPME Listing", message)
     except Exception as e:
         logging.error(f"Email notification failed: {e}")
     
     try:
-        send_sms(message)
+        with span("notify_sms"):
+            send_sms(message)
     except Exception as e:
         logging.error(f"SMS notification failed: {e}")
     
     try:
-        send_whatsapp(message)
+        with span("notify_whatsapp"):
+            send_whatsapp(message)
     except Exception as e:
         logging.error(f"WhatsApp notification failed: {e}")
\ No newline at end of file
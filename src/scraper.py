@@ -1,37 +1,224 @@
 """
 Web scraping functionality for CPME website.
+
+Pages are loaded with Playwright's async API so that, when the listings span
+several result pages, the extra pages can be fetched concurrently in separate
+contexts of a single browser.
 """
 
+import asyncio
 import logging
-from playwright.sync_api import sync_playwright
-from .config import CPME_URL
+import time
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
+
+from playwright.async_api import async_playwright, Browser, Page, TimeoutError as PlaywrightTimeoutError
+
+from .config import CPME_URL, CRAWL_MAX_PAGES, CRAWL_CONCURRENCY, CRAWL_MAX_SCROLLS, SCRAPE_TIMEOUT, PAGE_TIMEOUT
+from .tracing import span, annotate
+from .archive import get_archive
+from .watchdog import StallError
+
+# Find all "Andares disponíveis: X" elements (innermost match only) and
+# identify the listing each one belongs to, for deduplication across pages.
+LISTINGS_JS = """
+() => Array.from(document.querySelectorAll('*'))
+    .filter(el => el.textContent.trim().startsWith('Andares disponíveis'))
+    .filter(el => !Array.from(el.children).some(
+        child => child.textContent.trim().startsWith('Andares disponíveis')))
+    .map(el => {
+        const link = el.closest('a[href]');
+        let card = el;
+        while (card.parentElement && card.parentElement.textContent.trim() === el.textContent.trim()) {
+            card = card.parentElement;
+        }
+        card = card.parentElement || card;
+        return {
+            key: link ? link.href : card.textContent.trim().slice(0, 200),
+            count: parseInt(el.textContent.match(/\\d+/)[0]),
+        };
+    });
+"""
+
+# Links to other result pages: rel="next", page query parameters or pagination nav
+PAGINATION_JS = """
+() => {
+    const links = Array.from(document.querySelectorAll('a[href]')).filter(a =>
+        a.rel === 'next'
+        || /[?&](page|pagina|p)=\\d+/i.test(a.href)
+        || a.closest('.pagination, .pager, nav[aria-label*="pagin" i]'));
+    const here = location.href.split('#')[0];
+    return [...new Set(links.map(a => a.href.split('#')[0]))]
+        .filter(href => href.startsWith(location.origin) && href !== here);
+}
+"""
+
+
+def _phase(name: str, traced: bool):
+    return span(name) if traced else nullcontext()
+
+
+async def _wait_for_idle(page: Page) -> bool:
+    """
+    Wait for network idle, but scan what has loaded if the page never goes quiet.
+
+    Returns:
+        bool: Whether the page reached network idle.
+    """
+    try:
+        await page.wait_for_load_state("networkidle")
+        return True
+    except PlaywrightTimeoutError:
+        logging.warning("Page %s never reached network idle, scanning it as loaded", page.url)
+        annotate(networkidle_timeout=True)
+        return False
+
+
+async def _scroll_to_end(page: Page) -> None:
+    """Scroll until lazy-loaded sections stop growing the page (up to CRAWL_MAX_SCROLLS)."""
+    height = await page.evaluate("document.body.scrollHeight")
+    for _ in range(CRAWL_MAX_SCROLLS):
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        await _wait_for_idle(page)
+        new_height = await page.evaluate("document.body.scrollHeight")
+        if new_height == height:
+            break
+        height = new_height
+
+
+async def _scrape_page(browser: Browser, url: str, traced: bool = False,
+                       capture: bool = False) -> Tuple[List[Dict], List[str], Optional[str]]:
+    """
+    Load one result page in its own browser context.
+
+    Returns:
+        tuple: (listings found on the page, links to other result pages,
+        page HTML if capture is set)
+    """
+    context = await browser.new_context()
+    context.set_default_timeout(PAGE_TIMEOUT * 1000)
+    try:
+        page = await context.new_page()
+        with _phase("goto", traced):
+            await page.goto(url)
+        with _phase("networkidle", traced):
+            idle = await _wait_for_idle(page)
+        if CRAWL_MAX_SCROLLS > 0:
+            with _phase("scroll", traced):
+                await _scroll_to_end(page)
+        with _phase("dom_scan", traced):
+            listings = await page.evaluate(LISTINGS_JS)
+            links = await page.evaluate(PAGINATION_JS) if CRAWL_MAX_PAGES > 1 else []
+        if not idle and not listings:
+            # The listings are probably still loading; retrying beats alerting a count of 0
+            raise StallError("scraper", f"{url} never reached network idle and showed no listings")
+        html = await page.content() if capture else None
+        return listings, links, html
+    finally:
+        await context.close()
+
+
+async def _crawl(browser: Browser, capture: bool = False) -> Tuple[List[Dict], List[str]]:
+    """
+    Fetch the first page, then any discovered result pages concurrently, and merge them.
+
+    Returns:
+        tuple: (deduplicated listings, HTML of each page if capture is set)
+
+    Raises:
+        StallError: If any result page failed to load, so a partial total is never reported.
+    """
+    listings, links, html = await _scrape_page(browser, CPME_URL, traced=True, capture=capture)
+    pages = [listings]
+    snapshots = [html] if capture else []
+    seen = {CPME_URL}
+    semaphore = asyncio.Semaphore(CRAWL_CONCURRENCY)
+
+    async def fetch(url: str) -> Tuple[List[Dict], List[str], Optional[str]]:
+        async with semaphore:
+            return await _scrape_page(browser, url, capture=capture)
+
+    # Pagination often only links nearby pages, so keep following new links in waves
+    with span("crawl_pages"):
+        while links and len(seen) < CRAWL_MAX_PAGES:
+            batch = [url for url in dict.fromkeys(links) if url not in seen][:CRAWL_MAX_PAGES - len(seen)]
+            seen.update(batch)
+            results = await asyncio.gather(*(fetch(url) for url in batch), return_exceptions=True)
+            failed = [(url, result) for url, result in zip(batch, results) if isinstance(result, Exception)]
+            for url, error in failed:
+                logging.warning("Error scraping page %s: %s", url, error)
+            if failed:
+                # A total over only some of the pages would look like listings disappearing
+                raise StallError("scraper", f"{len(failed)} of {len(batch)} result pages failed to load")
+            links = []
+            for result in results:
+                pages.append(result[0])
+                links.extend(result[1])
+                if capture:
+                    snapshots.append(result[2])
+
+    # Merge in page order, dropping listings seen on an earlier page
+    merged = {}
+    for page_listings in pages:
+        for listing in page_listings:
+            merged.setdefault(listing["key"], listing)
+    annotate(pages=len(pages), listings=len(merged))
+    return list(merged.values()), snapshots
+
+
+async def _fetch_listings(capture: bool = False) -> Tuple[List[Dict], List[str]]:
+    async with async_playwright() as pw:
+        with span("browser_launch"):
+            browser = await pw.chromium.launch(headless=True)
+        try:
+            return await _crawl(browser, capture)
+        finally:
+            with span("browser_close"):
+                await browser.close()
 
 
 def fetch_habitacional_count() -> int:
     """
     Scrape the CPME website to get current listing count.
-    
+
+    On a single page (CRAWL_MAX_PAGES=1) this is the first listing's count.
+    When crawling several result pages, it is the total across all distinct
+    listings found, so a change on any page is detected.
+
+    When ARCHIVE_DIR is set, the raw HTML of every scraped page is archived.
+
     Returns:
         int: Number of available listings, 0 if none found or error.
+
+    Raises:
+        StallError: If loading the page timed out, or a further result page failed
+            to load. The browser is closed first.
     """
     try:
-        with sync_playwright() as pw:
-            browser = pw.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.goto(CPME_URL)
-            page.wait_for_load_state("networkidle")
-            
-            # Find all "Andares disponíveis: X" elements
-            counts = page.evaluate("""
-                Array.from(document.querySelectorAll('*'))
-                    .map(el => el.textContent.trim())
-                    .filter(text => text.startsWith('Andares disponíveis'))
-                    .map(text => parseInt(text.match(/\\d+/)[0]));
-            """)
-            
-            browser.close()
-            return counts[0] if counts else 0
-            
+        archive = get_archive()
+        try:
+            # Cancelling the crawl closes the browser, so a hung page can't leak
+            listings, snapshots = asyncio.run(
+                asyncio.wait_for(_fetch_listings(capture=archive is not None), SCRAPE_TIMEOUT))
+        except asyncio.TimeoutError:
+            raise StallError("scraper", f"check exceeded {SCRAPE_TIMEOUT}s") from None
+        except PlaywrightTimeoutError as e:
+            raise StallError("scraper", str(e).splitlines()[0]) from None
+
+        if archive is not None:
+            try:
+                with span("archive"):
+                    archive.append(time.time(), snapshots)
+            except Exception as e:
+                logging.error("Error archiving snapshot: %s", e)
+
+        if CRAWL_MAX_PAGES > 1:
+            return sum(listing["count"] for listing in listings)
+        return listings[0]["count"] if listings else 0
+
+    except StallError:
+        raise
     except Exception as e:
         logging.error("Error scraping website: %s", e)
-        return 0
\ No newline at end of file
+        annotate(scrape_error=str(e))
+        return 0
@@ -0,0 +1,276 @@
+"""
+Replay/simulation mode for CPME Monitor.
+
+Drives the real change-detection pipeline (``monitor.process_count``) from a
+recorded or synthetic timeline of listing counts, using a virtual clock and a
+recording notifier instead of the live site and real notification channels.
+Reports alerts sent, false positives, missed changes and detection latency.
+
+Usage:
+    python -m src.simulation --trace-file traces.jsonl
+    python -m src.simulation --synthetic-days 30 --failure-rate 0.01
+"""
+
+import argparse
+import bisect
+import json
+import random
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .config import POLL_INTERVAL
+from .monitor import process_count
+
+
+class VirtualClock:
+    """A clock that only advances when slept on."""
+
+    def __init__(self, start: float = 0.0) -> None:
+        self._now = start
+
+    def now(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float) -> None:
+        self._now += seconds
+
+
+# The count an alert reports, as written by ``monitor.build_message``
+REPORTED_COUNT = re.compile(r"Count: (\d+)")
+
+
+class RecordingNotifier:
+    """Mock notification sink that records every alert with its virtual time and reported count."""
+
+    def __init__(self, clock: VirtualClock) -> None:
+        self.clock = clock
+        self.alerts: List[Tuple[float, int, str]] = []
+
+    def __call__(self, message: str) -> None:
+        match = REPORTED_COUNT.search(message)
+        reported = int(match.group(1)) if match else -1
+        self.alerts.append((self.clock.now(), reported, message))
+
+
+class Timeline:
+    """
+    The true listing count over time, as a step function.
+
+    ``points`` are (seconds, count) pairs; each count holds until the next point.
+    ``failures`` are (start, end) windows during which scraping fails, so the
+    scraper returns 0 just like ``fetch_habitacional_count`` does on error.
+    """
+
+    def __init__(self, points: Iterable[Tuple[float, int]], failures: Iterable[Tuple[float, float]] = ()) -> None:
+        self.points = sorted(points)
+        if not self.points:
+            raise ValueError("Timeline needs at least one point")
+        self.times = [t for t, _ in self.points]
+        self.failures = sorted(failures)
+        self._failure_starts = [start for start, _ in self.failures]
+
+    @property
+    def start(self) -> float:
+        return self.times[0]
+
+    @property
+    def end(self) -> float:
+        return self.times[-1]
+
+    def count_at(self, t: float) -> int:
+        index = bisect.bisect_right(self.times, t) - 1
+        return self.points[max(index, 0)][1]
+
+    def failing_at(self, t: float) -> bool:
+        index = bisect.bisect_right(self._failure_starts, t) - 1
+        return index >= 0 and t < self.failures[index][1]
+
+    def changes(self) -> List[Tuple[float, int]]:
+        """Times at which the true count changed, with the new count."""
+        changes = []
+        for (_, previous), (t, count) in zip(self.points, self.points[1:]):
+            if count != previous:
+                changes.append((t, count))
+        return changes
+
+
+def load_trace_timeline(path: Path) -> Timeline:
+    """
+    Build a timeline from a TRACE_FILE recorded by the monitor.
+
+    Checks that failed to scrape become failure windows lasting until the
+    next recorded check; the true count is carried over from the last good one.
+    """
+    records = []
+    for line in path.read_text().splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if "count" not in record:
+            continue
+        t = datetime.fromisoformat(record["started_at"]).timestamp()
+        records.append((t, record["count"], "scrape_error" in record))
+
+    if not records:
+        raise ValueError(f"No checks with a count found in {path}")
+
+    records.sort()
+    origin = records[0][0]
+    points = []
+    failures = []
+    for i, (t, count, failed) in enumerate(records):
+        t -= origin
+        if failed:
+            end = records[i + 1][0] - origin if i + 1 < len(records) else t
+            failures.append((t, end))
+        else:
+            points.append((t, count))
+
+    if not points:
+        raise ValueError(f"Every check in {path} failed to scrape")
+    return Timeline(points, failures)
+
+
+def synthetic_timeline(duration: float, mean_change_interval: float = 3600.0, initial: int = 5, seed: int = 0) -> Timeline:
+    """Generate a random timeline where the count changes by a few listings at random times."""
+    rng = random.Random(seed)
+    points = [(0.0, initial)]
+    t, count = 0.0, initial
+    while True:
+        t += rng.expovariate(1.0 / mean_change_interval)
+        if t >= duration:
+            break
+        count = max(0, count + rng.choice([-2, -1, 1, 1, 2, 3]))
+        points.append((t, count))
+    points.append((duration, count))
+    return Timeline(points)
+
+
+class SimulationReport:
+    """Outcome of a simulation run."""
+
+    def __init__(self, polls: int, alerts: List[Tuple[float, int, str]], latencies: List[float],
+                 false_positives: int, missed_changes: int, simulated_seconds: float, wall_seconds: float) -> None:
+        self.polls = polls
+        self.alerts = alerts
+        self.latencies = latencies
+        self.false_positives = false_positives
+        self.missed_changes = missed_changes
+        self.simulated_seconds = simulated_seconds
+        self.wall_seconds = wall_seconds
+
+    def to_dict(self) -> Dict[str, float]:
+        latencies = self.latencies
+        return {
+            "polls": self.polls,
+            "alerts_sent": len(self.alerts),
+            "true_positives": len(latencies),
+            "false_positives": self.false_positives,
+            "missed_changes": self.missed_changes,
+            "mean_latency_s": round(sum(latencies) / len(latencies), 1) if latencies else None,
+            "max_latency_s": round(max(latencies), 1) if latencies else None,
+            "simulated_seconds": self.simulated_seconds,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "polls_per_second": round(self.polls / self.wall_seconds) if self.wall_seconds else None,
+        }
+
+
+def evaluate(timeline: Timeline, alerts: List[Tuple[float, int, str]]) -> Tuple[List[float], int, int]:
+    """
+    Score alerts against the true timeline.
+
+    An alert is a true positive if it reports the true count at that time and
+    that count differs from the one at the previous true alert; its latency is
+    measured from when the count last left that value.
+    A change is missed if it was superseded before any true alert reported it.
+
+    Returns:
+        tuple: (latencies, false_positives, missed_changes)
+    """
+    changes = timeline.changes()
+    change_times = [t for t, _ in changes]
+    acknowledged = timeline.count_at(timeline.start)
+    acknowledged_at = timeline.start
+    latencies = []
+    false_positives = 0
+    detected = set()
+
+    for t, reported, _ in alerts:
+        truth = timeline.count_at(t)
+        if reported != truth or truth == acknowledged:
+            false_positives += 1
+            continue
+        first = bisect.bisect_right(change_times, acknowledged_at)
+        latest = bisect.bisect_right(change_times, t) - 1
+        # Measure from when the count last moved away from the acknowledged value
+        start = latest
+        while start > first and changes[start - 1][1] != acknowledged:
+            start -= 1
+        latencies.append(t - change_times[start])
+        detected.add(latest)
+        acknowledged, acknowledged_at = truth, t
+
+    return latencies, false_positives, len(changes) - len(detected)
+
+
+def simulate(timeline: Timeline, poll_interval: float = POLL_INTERVAL, failure_rate: float = 0.0, seed: int = 0,
+             process: Callable[[int, int, Callable[[str], None]], int] = process_count,
+             clock: Optional[VirtualClock] = None) -> SimulationReport:
+    """
+    Run the monitor pipeline over a timeline on a virtual clock.
+
+    Args:
+        timeline: True listing counts over time.
+        poll_interval: Virtual seconds between checks.
+        failure_rate: Probability that any check fails to scrape (returns 0).
+        seed: Seed for failure injection.
+        process: Change-detection step; defaults to the real ``process_count``.
+        clock: Virtual clock to use; starts at the timeline start by default.
+    """
+    clock = clock or VirtualClock(timeline.start)
+    notifier = RecordingNotifier(clock)
+    rng = random.Random(seed)
+    last = timeline.count_at(clock.now())
+    polls = 0
+
+    wall_start = time.perf_counter()
+    while clock.now() <= timeline.end:
+        t = clock.now()
+        if timeline.failing_at(t) or (failure_rate and rng.random() < failure_rate):
+            current = 0
+        else:
+            current = timeline.count_at(t)
+        last = process(current, last, notifier)
+        polls += 1
+        clock.sleep(poll_interval)
+    wall_seconds = time.perf_counter() - wall_start
+
+    latencies, false_positives, missed = evaluate(timeline, notifier.alerts)
+    return SimulationReport(polls, notifier.alerts, latencies, false_positives, missed,
+                            timeline.end - timeline.start, wall_seconds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay listing counts through the monitor pipeline")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--trace-file", type=Path, help="TRACE_FILE recorded by the monitor")
+    source.add_argument("--synthetic-days", type=float, help="Generate a random timeline of this many days")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL, help="Seconds between checks")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability a check fails to scrape")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.trace_file:
+        timeline = load_trace_timeline(args.trace_file)
+    else:
+        timeline = synthetic_timeline(args.synthetic_days * 86400, seed=args.seed)
+
+    report = simulate(timeline, args.poll_interval, args.failure_rate, args.seed)
+    print(json.dumps(report.to_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Per-check tracing and profiling for CPME Monitor.
+
+Each monitor check gets a trace that collects the duration of every phase
+(browser launch, page load, DOM scan, notifications, ...) and is emitted as a
+single JSON line when the check finishes. Optionally, one check can be
+profiled with cProfile and tracemalloc.
+"""
+
+import cProfile
+import json
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from .config import TRACE_CHECKS, TRACE_FILE, PROFILE_CHECK, PROFILE_DIR
+
+T = TypeVar("T")
+
+
+class CheckTrace:
+    """Phase durations and extra fields collected during a single check."""
+
+    def __init__(self, check_number: int) -> None:
+        self.check_number = check_number
+        self.started_at = datetime.now().isoformat()
+        self.phases: Dict[str, float] = {}
+        self.fields: Dict[str, Any] = {}
+        self.finished = False
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration: float) -> None:
+        """Add a phase duration (seconds). Repeated phases are summed."""
+        with self._lock:
+            if not self.finished:
+                self.phases[name] = self.phases.get(name, 0.0) + duration
+
+    def update(self, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            if not self.finished:
+                self.fields.update(fields)
+
+    def finish(self) -> str:
+        """Close the trace to further writes and return it as JSON."""
+        with self._lock:
+            self.finished = True
+            return self.to_json()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "check": self.check_number,
+            "started_at": self.started_at,
+            "total_ms": round((time.perf_counter() - self._start) * 1000, 1),
+            "phases_ms": {name: round(d * 1000, 1) for name, d in self.phases.items()},
+            **self.fields,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), default=str)
+
+
+# The trace of the check currently in progress (None when tracing is disabled).
+# Watchdog workers run in a copy of the context, so a worker abandoned by one
+# check keeps writing to that check's (finished) trace, not the next one's.
+_current_trace: ContextVar[Optional[CheckTrace]] = ContextVar("current_trace", default=None)
+
+
+def start_check(check_number: int) -> Optional[CheckTrace]:
+    """Begin tracing a new check."""
+    trace = CheckTrace(check_number) if TRACE_CHECKS else None
+    _current_trace.set(trace)
+    return trace
+
+
+def end_check() -> None:
+    """Finish the current check and emit its trace as one JSON line."""
+    trace = _current_trace.get()
+    _current_trace.set(None)
+    if trace is None:
+        return
+
+    line = trace.finish()
+    logging.info(f"Check trace: {line}")
+    if TRACE_FILE is not None:
+        try:
+            with TRACE_FILE.open("a") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logging.error(f"Failed to write trace file: {e}")
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a phase of the current check. No-op when no check is being traced."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(name, time.perf_counter() - start)
+
+
+def annotate(**fields: Any) -> None:
+    """Attach extra fields to the current check's trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.update(fields)
+
+
+class CheckProfiler:
+    """
+    Collects cProfile data for one check across threads.
+
+    cProfile only sees the thread that enabled it, so work handed to another
+    thread (e.g. a watchdog worker) must be wrapped with ``wrap``.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def wrap(self, func: Callable[..., T]) -> Callable[..., T]:
+        """Return func profiled in whichever thread ends up running it."""
+        if not self.enabled:
+            return func
+
+        def profiled(*args: Any, **kwargs: Any) -> T:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+: the check's profiler already covers every thread
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+                # Only finished profiles are kept; an abandoned worker never gets here
+                with self._lock:
+                    self._profiles.append(profiler)
+
+        return profiled
+
+    def dump(self, path: Path, *extra: cProfile.Profile) -> None:
+        """Merge every collected profile, plus any extra ones, into one stats file."""
+        with self._lock:
+            profiles = [*extra, *self._profiles]
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(str(path))
+
+
+@contextmanager
+def profile_check(check_number: int) -> Iterator[CheckProfiler]:
+    """
+    Capture a cProfile and tracemalloc snapshot if this is the check
+    selected by PROFILE_CHECK. Other checks run unprofiled, and the yielded
+    profiler's ``wrap`` is a no-op for them.
+    """
+    if PROFILE_CHECK <= 0 or check_number != PROFILE_CHECK:
+        yield CheckProfiler(enabled=False)
+        return
+
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    check_profiler = CheckProfiler()
+    tracing_memory = tracemalloc.is_tracing()
+    if not tracing_memory:
+        tracemalloc.start()
+
+    # Profile the calling thread too
+    main_profiler = cProfile.Profile()
+    main_profiler.enable()
+    try:
+        yield check_profiler
+    finally:
+        main_profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        if not tracing_memory:
+            tracemalloc.stop()
+
+        prof_path = PROFILE_DIR / f"check-{check_number}.prof"
+        mem_path = PROFILE_DIR / f"check-{check_number}.tracemalloc"
+        check_profiler.dump(prof_path, main_profiler)
+        snapshot.dump(str(mem_path))
+        logging.info(f"Profiled check {check_number}: {prof_path}, {mem_path}")
@@ -0,0 +1,135 @@
+"""
+In-process watchdog for CPME Monitor.
+
+Runs each phase of a check (scraping, notifying) under a deadline so a hung
+page load or notification can't block the main loop forever. Stalls and
+recoveries are recorded per component and reported by the health endpoint.
+"""
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, TypeVar
+
+from .config import WATCHDOG_MAX_STUCK
+
+T = TypeVar("T")
+
+
+class StallError(Exception):
+    """A component missed its deadline."""
+
+    def __init__(self, component: str, reason: str) -> None:
+        super().__init__(f"{component} stalled: {reason}")
+        self.component = component
+        self.reason = reason
+
+
+class Watchdog:
+    """Enforces per-phase deadlines and tracks component health."""
+
+    def __init__(self, max_stuck: int = WATCHDOG_MAX_STUCK) -> None:
+        self.max_stuck = max_stuck
+        self._lock = threading.Lock()
+        self._components: Dict[str, Dict[str, Any]] = {}
+        self._stall_times: Dict[str, float] = {}
+        self._stuck: List[threading.Thread] = []
+
+    def _component(self, name: str) -> Dict[str, Any]:
+        return self._components.setdefault(name, {"status": "ok", "stalls": 0, "restarts": 0, "failed_restarts": 0})
+
+    def run(self, component: str, func: Callable[[], T], deadline: float) -> T:
+        """
+        Run func in a worker thread and wait at most deadline seconds for it.
+
+        Raises:
+            StallError: If the deadline passed or func itself reported a stall.
+        """
+        result: Dict[str, Any] = {}
+        # Threads don't inherit context variables; the worker keeps the caller's (e.g. its check's trace)
+        context = contextvars.copy_context()
+
+        def target() -> None:
+            try:
+                result["value"] = context.run(func)
+            except BaseException as e:
+                result["error"] = e
+
+        worker = threading.Thread(target=target, name=f"{component}-worker", daemon=True)
+        worker.start()
+        worker.join(deadline)
+
+        if worker.is_alive():
+            # Threads can't be killed; leave it behind and carry on with a fresh one next time
+            self._abandon(worker)
+            error = StallError(component, f"exceeded {deadline}s deadline")
+            self.record_stall(component, error.reason)
+            raise error
+
+        if isinstance(result.get("error"), StallError):
+            self.record_stall(component, result["error"].reason)
+            raise result["error"]
+
+        self.record_success(component)
+        if "error" in result:
+            raise result["error"]
+        return result["value"]
+
+    def _abandon(self, worker: threading.Thread) -> None:
+        with self._lock:
+            self._stuck = [thread for thread in self._stuck if thread.is_alive()] + [worker]
+            stuck = len(self._stuck)
+        if stuck >= self.max_stuck:
+            # In-process recovery isn't working; exit so the platform restarts us
+            logging.critical(f"{stuck} stuck workers could not be recovered, exiting")
+            os._exit(1)
+
+    def record_stall(self, component: str, reason: str) -> None:
+        logging.error(f"Watchdog: {component} stalled ({reason})")
+        with self._lock:
+            state = self._component(component)
+            state["status"] = "stalled"
+            state["stalls"] += 1
+            state["last_stall"] = datetime.now().isoformat()
+            state["last_stall_reason"] = reason
+            self._stall_times.setdefault(component, time.monotonic())
+
+    def record_success(self, component: str) -> None:
+        with self._lock:
+            state = self._component(component)
+            stalled_at = self._stall_times.pop(component, None)
+            if stalled_at is None:
+                state["status"] = "ok"
+                return
+            state["status"] = "recovered"
+            state["last_recovery"] = datetime.now().isoformat()
+            state["recovery_seconds"] = round(time.monotonic() - stalled_at, 1)
+        logging.info(f"Watchdog: {component} recovered after {state['recovery_seconds']}s")
+
+    def record_restart(self, component: str, succeeded: bool = True) -> None:
+        with self._lock:
+            state = self._component(component)
+            state["restarts"] += 1
+            state["last_restart"] = datetime.now().isoformat()
+            if succeeded:
+                state["status"] = "ok"
+            else:
+                state["status"] = "down"
+                state["failed_restarts"] += 1
+                state["last_failed_restart"] = state["last_restart"]
+        if succeeded:
+            logging.warning(f"Watchdog: restarted {component}")
+        else:
+            logging.error(f"Watchdog: failed to restart {component}, will retry")
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot of every component's state, for the health endpoint."""
+        with self._lock:
+            return {name: dict(state) for name, state in self._components.items()}
+
+
+# Shared by the monitor loop and the health server
+watchdog = Watchdog()
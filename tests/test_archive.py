@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Test the snapshot archive"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from pathlib import Path
+
+# Add parent directory to path so we can import from src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import archive as archive_module
+from src.archive import ArchiveLockedError, SnapshotArchive, extract_count, reextract
+
+def page(count, filler=""):
+    return f"<html><body><div><span>Andares disponíveis:</span> <b>{count}</b></div>{filler}</body></html>"
+
+def test_append_and_read():
+    """Test that snapshots are deduplicated and read back intact"""
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = SnapshotArchive(Path(tmp))
+        archive.append(100.0, [page(3)])
+        archive.append(160.0, [page(3)])
+        archive.append(220.0, [page(4), page(9)])
+
+        entries = archive.range()
+        assert len(entries) == 4
+        assert len({entry.digest for entry in entries}) == 3
+        assert archive.read(entries[0]) == page(3)
+        assert archive.read(entries[-1]) == page(9)
+        archive.close()
+
+        # Reopening loads the index from disk
+        archive = SnapshotArchive(Path(tmp))
+        assert [entry.timestamp for entry in archive.range(150.0, 300.0)] == [160.0, 220.0, 220.0]
+        archive.close()
+    print("✅ Append and read")
+
+def test_compaction():
+    """Test that sealed segments are merged and expired snapshots dropped"""
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = SnapshotArchive(Path(tmp), segment_size=1)
+        now = time.time()
+        for i in range(5):
+            archive.append(now - (5 - i) * 86400, [page(i, filler="x" * 1000)])
+        segments_before = len(list(Path(tmp).glob("segment-*.seg")))
+
+        archive.compact(retention_days=4)
+        entries = archive.range()
+        assert [extract_count(archive.read(entry)) for entry in entries] == [2, 3, 4]
+        assert len(list(Path(tmp).glob("segment-*.seg"))) < segments_before
+
+        # Appending after compaction still works, and so does reopening
+        archive.append(now, [page(5)])
+        archive.close()
+        archive = SnapshotArchive(Path(tmp))
+        assert [count for _, count in reextract(archive)] == [2, 3, 4, 5]
+        archive.close()
+    print("✅ Compaction")
+
+def test_compacted_segments_not_recompressed():
+    """Test that a later compaction leaves already-compacted segments alone"""
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = SnapshotArchive(Path(tmp), segment_size=1)
+        for i in range(3):
+            archive.append(float(i), [page(i)])
+        archive.compact()
+        compacted = {p.name: p.stat().st_mtime_ns for p in Path(tmp).glob("segment-*.compact.seg")}
+        assert len(compacted) == 1
+
+        # Nothing new sealed: nothing to do
+        archive.compact()
+        # New sealed segments get their own compacted segment
+        for i in range(3, 6):
+            archive.append(float(i), [page(i)])
+        archive.compact()
+
+        after = {p.name: p.stat().st_mtime_ns for p in Path(tmp).glob("segment-*.compact.seg")}
+        assert len(after) == 2
+        assert all(after[name] == mtime for name, mtime in compacted.items())
+        assert [count for _, count in reextract(archive)] == [0, 1, 2, 3, 4, 5]
+        archive.close()
+    print("✅ Compacted segments not recompressed")
+
+def test_append_during_compaction():
+    """Test that appends aren't blocked while a compaction is recompressing"""
+    recompressing = threading.Event()
+    release = threading.Event()
+
+    class SlowZlib:
+        decompress = staticmethod(zlib.decompress)
+
+        @staticmethod
+        def compress(data, level):
+            if level == archive_module.COMPACT_LEVEL:
+                recompressing.set()
+                release.wait(5)
+            return zlib.compress(data, level)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = SnapshotArchive(Path(tmp), segment_size=1)
+        for i in range(3):
+            archive.append(float(i), [page(i)])
+
+        archive_module.zlib = SlowZlib
+        try:
+            compaction = threading.Thread(target=archive.compact)
+            compaction.start()
+            assert recompressing.wait(5)
+
+            start = time.monotonic()
+            archive.append(10.0, [page(10)])
+            elapsed = time.monotonic() - start
+            release.set()
+            compaction.join(5)
+        finally:
+            archive_module.zlib = zlib
+            release.set()
+
+        assert elapsed < 1
+        assert [count for _, count in reextract(archive)] == [0, 1, 2, 10]
+        archive.close()
+    print(f"✅ Append during compaction took {elapsed:.3f}s")
+
+def test_single_writer():
+    """Test that a second writer is refused while readers are still allowed"""
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = SnapshotArchive(Path(tmp))
+        writer.append(1.0, [page(1)])
+        try:
+            SnapshotArchive(Path(tmp))
+            assert False, "Expected ArchiveLockedError"
+        except ArchiveLockedError:
+            pass
+
+        reader = SnapshotArchive(Path(tmp), writable=False)
+        assert [count for _, count in reextract(reader)] == [1]
+        try:
+            reader.compact()
+            assert False, "Expected ArchiveLockedError"
+        except ArchiveLockedError:
+            pass
+        reader.close()
+
+        # The lock is released on close
+        writer.close()
+        SnapshotArchive(Path(tmp)).close()
+    print("✅ Single writer")
+
+def test_read_during_compaction():
+    """Test that a reader opened before a compaction can still read moved snapshots"""
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = SnapshotArchive(Path(tmp), segment_size=1)
+        for i in range(3):
+            writer.append(float(i), [page(i)])
+
+        reader = SnapshotArchive(Path(tmp), writable=False)
+        entries = reader.range()
+        writer.compact()
+        assert [extract_count(reader.read(entry)) for entry in entries] == [0, 1, 2]
+        reader.close()
+        writer.close()
+    print("✅ Read during compaction")
+
+def test_reextract_total():
+    """Test that re-extraction can sum over every page of a check, like a multi-page crawl"""
+    two_listings = "<div>Andares disponíveis: 2</div><div>Andares disponíveis: 5</div>"
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = SnapshotArchive(Path(tmp))
+        archive.append(1.0, [two_listings, page(4)])
+        archive.append(2.0, [two_listings])
+        assert list(reextract(archive, total=False)) == [(1.0, 2), (2.0, 2)]
+        assert list(reextract(archive, total=True)) == [(1.0, 11), (2.0, 7)]
+        archive.close()
+    print("✅ Re-extract total")
+
+def test_extract_count():
+    """Test extraction from archived HTML"""
+    assert extract_count(page(7)) == 7
+    assert extract_count(page(7) + page(2), total=True) == 9
+    assert extract_count("<html><script>Andares disponíveis 1</script><p>Nada</p></html>") == 0
+    assert extract_count("<p>Pisos livres: 2</p>", pattern=r"Pisos livres\D*(\d+)") == 2
+    print("✅ Extract count")
+
+if __name__ == "__main__":
+    print("Testing snapshot archive...")
+    print("=" * 40)
+    test_append_and_read()
+    test_compaction()
+    test_compacted_segments_not_recompressed()
+    test_append_during_compaction()
+    test_single_writer()
+    test_read_during_compaction()
+    test_reextract_total()
+    test_extract_count()
+    print("=" * 40)
+    print("✅ Archive tests passed!")
@@ -4,12 +4,15 @@
 import logging
 import os
 import sys
+import threading
 from pathlib import Path
 
 # Add parent directory to path so we can import from src
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src import monitor
 from src.scraper import fetch_habitacional_count
+from src.watchdog import StallError
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
@@ -57,10 +60,26 @@ def test_monitor_logic():
         if test_file.exists():
             test_file.unlink()
 
+def test_notify_stall_keeps_last():
+    """Test that a change whose notification stalled is not treated as notified"""
+    release = threading.Event()
+    old_timeout = monitor.NOTIFY_TIMEOUT
+    monitor.NOTIFY_TIMEOUT = 0.1
+    try:
+        monitor.process_count(5, 3, lambda message: monitor.notify_with_deadline(message, lambda _: release.wait()))
+        assert False, "Expected StallError"
+    except StallError as e:
+        assert e.component == "notifier"
+    finally:
+        monitor.NOTIFY_TIMEOUT = old_timeout
+        release.set()
+    print("✅ Notify stall keeps last count")
+
 if __name__ == "__main__":
     print("Testing monitor logic...")
     print("=" * 40)
     
+    test_notify_stall_keeps_last()
     success = test_monitor_logic()
     
     print("=" * 40)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Test the paginated crawl against a fake browser"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path so we can import from src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import archive, scraper
+from src.watchdog import StallError
+
+class FakeSite:
+    """Result pages as url -> (listings, links); urls in `broken` fail to load."""
+
+    def __init__(self, pages, broken=(), busy=()):
+        self.pages = pages
+        self.broken = set(broken)
+        # Pages that never reach network idle
+        self.busy = set(busy)
+        self.fetched = []
+        self.active = 0
+        self.max_active = 0
+
+class FakePage:
+    def __init__(self, site):
+        self.site = site
+        self.url = None
+
+    async def goto(self, url):
+        self.site.fetched.append(url)
+        self.site.active += 1
+        self.site.max_active = max(self.site.max_active, self.site.active)
+        try:
+            await asyncio.sleep(0.01)
+            if url in self.site.broken:
+                raise RuntimeError(f"Failed to load {url}")
+            self.url = url
+        finally:
+            self.site.active -= 1
+
+    async def wait_for_load_state(self, state):
+        if self.url in self.site.busy:
+            raise scraper.PlaywrightTimeoutError("Timeout 30000ms exceeded")
+
+    async def evaluate(self, script):
+        listings, links = self.site.pages[self.url]
+        return listings if script == scraper.LISTINGS_JS else links
+
+    async def content(self):
+        return f"<html>{self.url}</html>"
+
+class FakeContext:
+    def __init__(self, site):
+        self.site = site
+
+    def set_default_timeout(self, timeout):
+        pass
+
+    async def new_page(self):
+        return FakePage(self.site)
+
+    async def close(self):
+        pass
+
+class FakeBrowser:
+    def __init__(self, site):
+        self.site = site
+
+    async def new_context(self):
+        return FakeContext(self.site)
+
+def crawl(site, max_pages, concurrency):
+    old = scraper.CRAWL_MAX_PAGES, scraper.CRAWL_CONCURRENCY
+    scraper.CRAWL_MAX_PAGES, scraper.CRAWL_CONCURRENCY = max_pages, concurrency
+    try:
+        return asyncio.run(scraper._crawl(FakeBrowser(site)))
+    finally:
+        scraper.CRAWL_MAX_PAGES, scraper.CRAWL_CONCURRENCY = old
+
+def listing(key, count):
+    return {"key": key, "count": count}
+
+def test_dedup_across_pages():
+    """Test that listings repeated on later pages are merged once, in page order"""
+    first = scraper.CPME_URL
+    site = FakeSite({
+        first: ([listing("a", 3)], ["p2", "p3"]),
+        "p2": ([listing("a", 3), listing("b", 1)], ["p3"]),
+        "p3": ([listing("c", 2)], [first]),
+    })
+    listings, _ = crawl(site, max_pages=10, concurrency=4)
+
+    assert [item["key"] for item in listings] == ["a", "b", "c"]
+    assert sorted(site.fetched) == sorted([first, "p2", "p3"])
+    print(f"✅ Dedup across pages: {listings}")
+
+def test_page_limit_and_concurrency():
+    """Test that no more than CRAWL_MAX_PAGES are fetched, CRAWL_CONCURRENCY at a time"""
+    first = scraper.CPME_URL
+    others = [f"p{i}" for i in range(2, 12)]
+    pages = {first: ([listing("first", 1)], others)}
+    pages.update({url: ([listing(url, 1)], []) for url in others})
+    site = FakeSite(pages)
+    listings, _ = crawl(site, max_pages=5, concurrency=2)
+
+    assert len(site.fetched) == 5
+    assert len(listings) == 5
+    assert site.max_active == 2
+    print(f"✅ Page limit and concurrency: fetched {len(site.fetched)}, max concurrent {site.max_active}")
+
+def test_failed_page_stalls():
+    """Test that a page failing to load stalls the check instead of lowering the total"""
+    first = scraper.CPME_URL
+    pages = {
+        first: ([listing("a", 3)], ["p2", "p3"]),
+        "p2": ([listing("b", 1)], []),
+        "p3": ([listing("c", 2)], []),
+    }
+    for broken in ("p2", "p3"):
+        site = FakeSite(pages, broken=[broken])
+        try:
+            crawl(site, max_pages=10, concurrency=4)
+            assert False, "Expected StallError"
+        except StallError as e:
+            assert e.component == "scraper"
+    print("✅ Failed page stalls")
+
+def test_busy_page_without_listings_stalls():
+    """Test that a page still loading its listings is retried rather than read as 0"""
+    first = scraper.CPME_URL
+    site = FakeSite({first: ([], [])}, busy=[first])
+    try:
+        crawl(site, max_pages=1, concurrency=1)
+        assert False, "Expected StallError"
+    except StallError as e:
+        assert e.component == "scraper"
+
+    # If the listings did load, they are used even without network idle
+    site = FakeSite({first: ([listing("a", 3)], [])}, busy=[first])
+    listings, _ = crawl(site, max_pages=1, concurrency=1)
+    assert listings == [listing("a", 3)]
+    print("✅ Busy page without listings stalls")
+
+def test_count_without_archive():
+    """Test that an archive that can't be opened doesn't stop the scrape"""
+    async def fake_fetch(capture=False):
+        return [listing("a", 3)], []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A directory can't be created under a regular file
+        blocker = Path(tmp) / "file"
+        blocker.write_text("")
+        old = archive.ARCHIVE_DIR, scraper._fetch_listings
+        archive.ARCHIVE_DIR, scraper._fetch_listings = blocker / "archive", fake_fetch
+        try:
+            assert scraper.fetch_habitacional_count() == 3
+            assert scraper.fetch_habitacional_count() == 3
+            assert archive._archive is None
+        finally:
+            archive.ARCHIVE_DIR, scraper._fetch_listings = old
+            archive._archive_unavailable = False
+    print("✅ Count without archive")
+
+if __name__ == "__main__":
+    print("Testing crawl...")
+    print("=" * 40)
+    test_dedup_across_pages()
+    test_page_limit_and_concurrency()
+    test_failed_page_stalls()
+    test_busy_page_without_listings_stalls()
+    test_count_without_archive()
+    print("=" * 40)
+    print("✅ Crawl tests passed!")
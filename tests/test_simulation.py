@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Test the monitor pipeline against simulated timelines"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path so we can import from src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.simulation import Timeline, load_trace_timeline, simulate, synthetic_timeline
+
+def test_detects_changes():
+    """Test that every real change is alerted within one poll interval"""
+    timeline = Timeline([(0, 5), (100, 6), (400, 4), (1000, 4)])
+    report = simulate(timeline, poll_interval=60).to_dict()
+
+    assert report["alerts_sent"] == 2
+    assert report["false_positives"] == 0
+    assert report["missed_changes"] == 0
+    assert report["max_latency_s"] < 60
+    print(f"✅ Detected changes: {report}")
+
+def test_scrape_failures_are_false_positives():
+    """Test that a failed scrape (count 0) causes false alerts"""
+    timeline = Timeline([(0, 5), (600, 5)], failures=[(120, 180)])
+    report = simulate(timeline, poll_interval=60).to_dict()
+
+    # One alert dropping to 0, one alert going back to 5
+    assert report["alerts_sent"] == 2
+    assert report["false_positives"] == 2
+    print(f"✅ Scrape failures: {report}")
+
+def test_alert_must_report_true_count():
+    """Test that a failed-scrape alert is not credited with a real change"""
+    timeline = Timeline([(0, 5), (100, 6), (600, 6)], failures=[(110, 130)])
+    report = simulate(timeline, poll_interval=60)
+
+    # t=120 reports 0 during the failure, t=180 reports the real count 6
+    assert [(t, reported) for t, reported, _ in report.alerts] == [(120, 0), (180, 6)]
+    result = report.to_dict()
+    assert result["true_positives"] == 1
+    assert result["false_positives"] == 1
+    assert result["max_latency_s"] == 80
+    print(f"✅ Alert must report true count: {result}")
+
+def test_missed_transient_change():
+    """Test that a change reverted between polls is reported as missed"""
+    timeline = Timeline([(0, 5), (10, 6), (20, 5), (300, 5)])
+    report = simulate(timeline, poll_interval=60).to_dict()
+
+    assert report["alerts_sent"] == 0
+    assert report["missed_changes"] == 2
+    print(f"✅ Missed transient change: {report}")
+
+def test_trace_file_replay():
+    """Test replaying a recorded TRACE_FILE"""
+    records = [
+        {"check": 1, "started_at": "2025-01-01T10:00:00", "count": 3},
+        {"check": 2, "started_at": "2025-01-01T10:01:00", "count": 0, "scrape_error": "Timeout"},
+        {"check": 3, "started_at": "2025-01-01T10:02:00", "count": 4},
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "traces.jsonl"
+        path.write_text("\n".join(json.dumps(r) for r in records) + "\n")
+        timeline = load_trace_timeline(path)
+
+    assert timeline.points == [(0.0, 3), (120.0, 4)]
+    assert timeline.failing_at(90.0)
+    report = simulate(timeline, poll_interval=60).to_dict()
+    assert report["true_positives"] == 1
+    print(f"✅ Trace replay: {report}")
+
+def test_simulation_speed():
+    """Test that a month of polls runs at thousands of polls per second"""
+    timeline = synthetic_timeline(30 * 86400)
+    report = simulate(timeline, poll_interval=60).to_dict()
+
+    assert report["polls"] > 40000
+    assert report["polls_per_second"] > 1000
+    print(f"✅ Simulated a month: {report}")
+
+if __name__ == "__main__":
+    print("Testing simulation...")
+    print("=" * 40)
+    test_detects_changes()
+    test_scrape_failures_are_false_positives()
+    test_alert_must_report_true_count()
+    test_missed_transient_change()
+    test_trace_file_replay()
+    test_simulation_speed()
+    print("=" * 40)
+    print("✅ Simulation tests passed!")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Test per-check tracing and profiling"""
+
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path so we can import from src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import tracing
+from src.watchdog import Watchdog, StallError
+
+def test_check_trace():
+    """Test that spans and annotations end up in the check trace"""
+    trace = tracing.start_check(1)
+    assert trace is not None
+
+    with tracing.span("goto"):
+        time.sleep(0.01)
+    with tracing.span("goto"):
+        time.sleep(0.01)
+    tracing.annotate(count=3)
+
+    record = json.loads(trace.to_json())
+    tracing.end_check()
+
+    assert record["check"] == 1
+    assert record["count"] == 3
+    assert record["phases_ms"]["goto"] >= 20
+    assert record["total_ms"] >= record["phases_ms"]["goto"]
+    print(f"✅ Trace: {record}")
+
+def test_span_without_check():
+    """Test that spans are a no-op outside of a traced check"""
+    with tracing.span("orphan"):
+        pass
+    tracing.annotate(ignored=True)
+    print("✅ Span without check is a no-op")
+
+def test_profile_check():
+    """Test that only the selected check gets profiled"""
+    with tempfile.TemporaryDirectory() as tmp:
+        old_check, old_dir = tracing.PROFILE_CHECK, tracing.PROFILE_DIR
+        tracing.PROFILE_CHECK, tracing.PROFILE_DIR = 2, Path(tmp)
+        try:
+            for check_number in (1, 2, 3):
+                with tracing.profile_check(check_number):
+                    sum(range(1000))
+            files = sorted(p.name for p in Path(tmp).iterdir())
+        finally:
+            tracing.PROFILE_CHECK, tracing.PROFILE_DIR = old_check, old_dir
+
+    assert files == ["check-2.prof", "check-2.tracemalloc"]
+    print(f"✅ Profile files: {files}")
+
+def fake_scrape():
+    return sum(i * i for i in range(10000))
+
+def test_profile_watchdog_worker():
+    """Test that work run in a watchdog worker thread shows up in the profile"""
+    with tempfile.TemporaryDirectory() as tmp:
+        old_check, old_dir = tracing.PROFILE_CHECK, tracing.PROFILE_DIR
+        tracing.PROFILE_CHECK, tracing.PROFILE_DIR = 1, Path(tmp)
+        try:
+            with tracing.profile_check(1) as profiler:
+                Watchdog().run("scraper", profiler.wrap(fake_scrape), deadline=5)
+            stats = pstats.Stats(str(Path(tmp) / "check-1.prof"))
+        finally:
+            tracing.PROFILE_CHECK, tracing.PROFILE_DIR = old_check, old_dir
+
+    functions = {name for _, _, name in stats.stats}
+    assert "fake_scrape" in functions
+    print("✅ Watchdog worker profiled")
+
+def test_abandoned_worker_trace():
+    """Test that a worker abandoned by one check doesn't write into the next check's trace"""
+    release = threading.Event()
+    done = threading.Event()
+
+    def hung_scrape():
+        release.wait(5)
+        with tracing.span("browser_close"):
+            pass
+        tracing.annotate(scrape_error="late")
+        done.set()
+
+    first = tracing.start_check(1)
+    try:
+        Watchdog().run("scraper", hung_scrape, deadline=0.1)
+        assert False, "Expected StallError"
+    except StallError:
+        pass
+    tracing.end_check()
+
+    second = tracing.start_check(2)
+    release.set()
+    assert done.wait(5)
+    record = second.to_dict()
+    tracing.end_check()
+
+    assert "scrape_error" not in record
+    assert "browser_close" not in record["phases_ms"]
+    assert "scrape_error" not in first.to_dict()
+    print("✅ Abandoned worker doesn't touch the next trace")
+
+if __name__ == "__main__":
+    print("Testing tracing...")
+    print("=" * 40)
+    test_check_trace()
+    test_span_without_check()
+    test_profile_check()
+    test_profile_watchdog_worker()
+    test_abandoned_worker_trace()
+    print("=" * 40)
+    print("✅ Tracing tests passed!")
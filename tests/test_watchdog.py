@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Test the watchdog's deadlines and stall recovery"""
+
+import os
+import sys
+import threading
+
+# Add parent directory to path so we can import from src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.watchdog import Watchdog, StallError
+
+def test_stall_and_recovery():
+    """Test that a hung phase is abandoned and the next success counts as recovery"""
+    watchdog = Watchdog(max_stuck=10)
+    release = threading.Event()
+
+    try:
+        watchdog.run("scraper", release.wait, deadline=0.1)
+        assert False, "Expected StallError"
+    except StallError as e:
+        assert e.component == "scraper"
+    finally:
+        release.set()
+
+    state = watchdog.status()["scraper"]
+    assert state["status"] == "stalled"
+    assert state["stalls"] == 1
+
+    assert watchdog.run("scraper", lambda: 7, deadline=1) == 7
+    state = watchdog.status()["scraper"]
+    assert state["status"] == "recovered"
+    assert state["recovery_seconds"] < 5
+
+    watchdog.run("scraper", lambda: 7, deadline=1)
+    assert watchdog.status()["scraper"]["status"] == "ok"
+    print(f"✅ Stall and recovery: {state}")
+
+def test_reported_stall():
+    """Test that a phase which cancels itself on timeout is recorded as a stall"""
+    watchdog = Watchdog()
+
+    def timed_out():
+        raise StallError("scraper", "Timeout 30000ms exceeded")
+
+    try:
+        watchdog.run("scraper", timed_out, deadline=1)
+        assert False, "Expected StallError"
+    except StallError:
+        pass
+    assert watchdog.status()["scraper"]["last_stall_reason"] == "Timeout 30000ms exceeded"
+    print("✅ Reported stall")
+
+def test_errors_propagate():
+    """Test that ordinary errors are passed through, not treated as stalls"""
+    watchdog = Watchdog()
+
+    def broken():
+        raise ValueError("bad markup")
+
+    try:
+        watchdog.run("scraper", broken, deadline=1)
+        assert False, "Expected ValueError"
+    except ValueError:
+        pass
+    assert watchdog.status()["scraper"]["stalls"] == 0
+    print("✅ Errors propagate")
+
+def test_restart_tracking():
+    """Test that failed restarts are recorded until a restart succeeds"""
+    watchdog = Watchdog()
+    watchdog.record_restart("health_server", succeeded=False)
+    state = watchdog.status()["health_server"]
+    assert state["status"] == "down"
+    assert state["failed_restarts"] == 1
+
+    watchdog.record_restart("health_server")
+    state = watchdog.status()["health_server"]
+    assert state["status"] == "ok"
+    assert state["restarts"] == 2
+    assert state["failed_restarts"] == 1
+    print(f"✅ Restart tracking: {state}")
+
+if __name__ == "__main__":
+    print("Testing watchdog...")
+    print("=" * 40)
+    test_stall_and_recovery()
+    test_reported_stall()
+    test_errors_propagate()
+    test_restart_tracking()
+    print("=" * 40)
+    print("✅ Watchdog tests passed!")